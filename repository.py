@@ -5,74 +5,346 @@
 Модуль для работы с репозиторием Ubuntu (apt)
 """
 
+import urllib.error
 import urllib.request
-import gzip
+import hashlib
+import json
+import os
+import pickle
 import re
-from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Ускоренная (SIMD) реализация Deflate из пакета isal, если он установлен
+try:
+    from isal import isal_zlib as _zlib
+except ImportError:
+    import zlib as _zlib
+
+
+# wbits для распаковки gzip: заголовок gzip + максимальное окно
+_GZIP_WBITS = 31
+# Размер блока при чтении файла Packages
+_CHUNK_SIZE = 64 * 1024
+
+# Минимальный размер данных, при котором полный разбор распараллеливается
+_PARALLEL_MIN_SIZE = 4 * 1024 * 1024
+
+# Путь к файлу Packages.gz относительно корня репозитория
+DEFAULT_DISTS_PATH = 'dists/jammy/main/binary-amd64/Packages.gz'
+
+# Каталог для кэша разобранных файлов Packages
+CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'apt-dep-viz'
+
+
+# Граница станз: пустая строка или строка только из пробелов и табуляций
+_BOUNDARY_RE = re.compile(rb'\n[ \t]*\n')
+# Строка с именем пакета, начинающая запись в индексе смещений. Шаблон
+# начинается с литерала "\nPackage:" (а не с ^ и re.M), чтобы движок re
+# искал его быстрым поиском подстроки, а не пробовал каждую позицию
+_PACKAGE_RE = re.compile(rb'\nPackage:[ \t]*(\S+)')
+# Та же строка в самом начале индексируемой области
+_PACKAGE_HEAD_RE = re.compile(rb'Package:[ \t]*(\S+)')
+# Поля станзы, которые сохраняются в PackageRecord
+_WANTED = frozenset((b'Package', b'Version', b'Architecture', b'Depends',
+                     b'Pre-Depends', b'Provides'))
+# Нужное поле станзы: "Имя: значение" вместе со строками-продолжениями.
+# Остальные поля (Description, хэши, Filename, ...) пропускаются самим re
+_FIELD_RE = re.compile(
+    rb'^(' + b'|'.join(re.escape(field) for field in sorted(_WANTED)) + rb'):[ \t]*(.*(?:\n[ \t].*)*)',
+    re.M
+)
+# Перевод строки с отступом внутри многострочного значения
+_CONTINUATION_RE = re.compile(rb'[ \t]*\n[ \t]+')
+# Одна зависимость из поля Depends: имя (с уточнением архитектуры), версия
+# и альтернативы через "|"; в группу попадает только имя первой альтернативы
+_DEP_RE = re.compile(
+    rb'([A-Za-z0-9][A-Za-z0-9+\-.]*(?::[A-Za-z0-9-]+)?)(?:\s*\([^)]*\))?'
+    rb'(?:\s*\|\s*[A-Za-z0-9][A-Za-z0-9+\-.]*(?::[A-Za-z0-9-]+)?(?:\s*\([^)]*\))?)*'
+)
+
+
+class _NotModified(Exception):
+    """Файл Packages не изменился с момента сохранения кэша"""
+
+
+class PackageRecord:
+    """
+    Запись о пакете из файла Packages
+    
+    Хранит только поля, нужные для построения графа. Поля Depends,
+    Pre-Depends и Provides остаются в bytes (raw_*) и декодируются
+    только по запросу.
+    """
+    
+    __slots__ = ('name', 'version', 'architecture', 'raw_depends', 'raw_pre_depends', 'raw_provides')
+    
+    def __init__(self, name: str, version: str = '', architecture: str = '',
+                 raw_depends: bytes = b'', raw_pre_depends: bytes = b'', raw_provides: bytes = b''):
+        self.name = name
+        self.version = version
+        self.architecture = architecture
+        self.raw_depends = raw_depends
+        self.raw_pre_depends = raw_pre_depends
+        self.raw_provides = raw_provides
+    
+    @property
+    def depends(self) -> str:
+        """Поле Depends в виде текста"""
+        return _decode_value(self.raw_depends)
+    
+    @property
+    def pre_depends(self) -> str:
+        """Поле Pre-Depends в виде текста"""
+        return _decode_value(self.raw_pre_depends)
+    
+    @property
+    def provides(self) -> str:
+        """Поле Provides в виде текста"""
+        return _decode_value(self.raw_provides)
+
+
+def _decode_value(value: bytes) -> str:
+    """Декодировать значение поля, склеив строки-продолжения через перевод строки"""
+    if b'\n' in value:
+        value = _CONTINUATION_RE.sub(b'\n', value)
+    return value.strip().decode('utf-8')
 
 
 class PackageRepository:
     """Класс для работы с репозиторием пакетов Ubuntu"""
     
-    def __init__(self, repository_url: str, test_mode: bool = False):
+    def __init__(self, repository_url: str, test_mode: bool = False,
+                 use_cache: Optional[bool] = None, dists_path: str = DEFAULT_DISTS_PATH):
         """
         Инициализация репозитория
         
         Args:
             repository_url: URL репозитория или путь к файлу
             test_mode: Флаг тестового режима
+            use_cache: Сохранять файл Packages и индекс на диск
+                (None = только для URL, в тестовом режиме кэш не нужен)
+            dists_path: Путь к Packages.gz относительно URL репозитория
         """
-        self.repository_url = repository_url
+        # URL нормализуется один раз, а не при каждом построении пути
+        self.repository_url = repository_url if test_mode else repository_url.rstrip('/')
+        self.dists_path = dists_path.strip('/')
         self.test_mode = test_mode
-        self.packages_cache = {}
+        self.use_cache = (not test_mode) if use_cache is None else use_cache
+        # Разобранные станзы (заполняется по мере обращения к пакетам)
+        self.packages_cache: Dict[str, PackageRecord] = {}
+        # Уже вычисленные списки зависимостей {пакет: [зависимости]}
+        self._deps_cache: Dict[str, List[str]] = {}
+        # Распакованный файл Packages и индекс {пакет: (начало, конец) станзы}
+        self._data: Optional[bytearray] = None
+        self._offset_index: Dict[str, Tuple[int, int]] = {}
+        # Признаки версии последнего прочитанного файла Packages (для кэша)
+        self._source_validator: Optional[Dict[str, str]] = None
         
-    def fetch_packages_file(self) -> str:
+        source = os.path.abspath(self.repository_url) if test_mode else self._construct_packages_url()
+        key = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        self.cache_path = CACHE_DIR / f"{key}.pickle"
+        self.cache_meta_path = CACHE_DIR / f"{key}.meta"
+        
+    def fetch_packages_file(self, cached_validator: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
         """
-        Получить содержимое файла Packages из репозитория
+        Получить содержимое файла Packages из репозитория по блокам
+        
+        Файл читается (и распаковывается) блоками по мере того,
+        как их забирает вызывающий код.
+        
+        Args:
+            cached_validator: Признаки версии закэшированного файла; если файл
+                с тех пор не изменился, чтение прерывается исключением _NotModified
         
         Returns:
-            str: Содержимое файла Packages
+            Iterator[bytes]: Блоки файла Packages
         """
         if self.test_mode:
-            return self._read_local_file(self.repository_url)
+            return self._read_local_file(self.repository_url, cached_validator)
         else:
-            return self._fetch_from_url(self.repository_url)
+            return self._fetch_from_url(cached_validator)
     
-    def _read_local_file(self, filepath: str) -> str:
-        """Чтение локального тестового файла"""
+    def _read_local_file(self, filepath: str,
+                         cached_validator: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+        """Чтение локального тестового файла по блокам"""
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return f.read()
+            with open(filepath, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                self._source_validator = {'mtime': str(stat.st_mtime_ns), 'size': str(stat.st_size)}
+                
+                if self._source_validator == cached_validator:
+                    raise _NotModified()
+                
+                yield from iter(lambda: f.read(_CHUNK_SIZE), b'')
+        except _NotModified:
+            raise
         except FileNotFoundError:
             raise FileNotFoundError(f"Тестовый файл не найден: {filepath}")
         except Exception as e:
             raise Exception(f"Ошибка чтения файла: {e}")
     
-    def _fetch_from_url(self, url: str) -> str:
-        """Загрузка файла Packages из URL"""
+    def _fetch_from_url(self, cached_validator: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+        """
+        Потоковая загрузка и распаковка файла Packages из URL по блокам
+        
+        При наличии кэша отправляется условный запрос (If-None-Match /
+        If-Modified-Since), и ответ 304 не требует повторной загрузки.
+        """
         try:
-            packages_url = self._construct_packages_url(url)
+            packages_url = self._construct_packages_url()
             print(f"Загрузка данных из: {packages_url}")
             
-            with urllib.request.urlopen(packages_url, timeout=30) as response:
-                compressed_data = response.read()
+            headers = {}
+            if cached_validator:
+                if cached_validator.get('etag'):
+                    headers['If-None-Match'] = cached_validator['etag']
+                if cached_validator.get('last_modified'):
+                    headers['If-Modified-Since'] = cached_validator['last_modified']
+            
+            request = urllib.request.Request(packages_url, headers=headers)
+            try:
+                response = urllib.request.urlopen(request, timeout=30)
+            except urllib.error.HTTPError as e:
+                if e.code == 304:
+                    print("Файл Packages не изменился, используется кэш")
+                    raise _NotModified() from None
+                raise
+            
+            decompressor = _zlib.decompressobj(wbits=_GZIP_WBITS)
+            
+            with response:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                self._source_validator = None
+                if etag or last_modified:
+                    self._source_validator = {'etag': etag or '', 'last_modified': last_modified or ''}
+                
+                for chunk in iter(lambda: response.read(_CHUNK_SIZE), b''):
+                    # Архив может состоять из нескольких gzip-членов подряд:
+                    # после конца члена остаток данных попадает в unused_data
+                    while chunk:
+                        if decompressor.eof:
+                            decompressor = _zlib.decompressobj(wbits=_GZIP_WBITS)
+                        yield decompressor.decompress(chunk)
+                        chunk = decompressor.unused_data if decompressor.eof else b''
             
-            decompressed_data = gzip.decompress(compressed_data)
-            return decompressed_data.decode('utf-8')
+            yield decompressor.flush()
+            if not decompressor.eof:
+                raise EOFError("архив Packages.gz обрезан")
             
+        except _NotModified:
+            raise
         except Exception as e:
             raise Exception(f"Ошибка загрузки репозитория: {e}")
     
-    def _construct_packages_url(self, base_url: str) -> str:
+    def _construct_packages_url(self) -> str:
         """Построить URL к файлу Packages.gz"""
-        if base_url.endswith('/'):
-            base_url = base_url.rstrip('/')
+        return f"{self.repository_url}/{self.dists_path}"
+    
+    @staticmethod
+    def build_offset_index(packages_data: bytes, start: int = 0,
+                           end: Optional[int] = None) -> Dict[str, Tuple[int, int]]:
+        """
+        Построить индекс станз без разбора их полей
+        
+        Args:
+            packages_data: Содержимое файла Packages
+            start: Начало индексируемой области (граница станзы)
+            end: Конец индексируемой области (граница станзы, None = до конца)
+            
+        Returns:
+            Dict: Словарь {имя пакета: (начало, конец) станзы в packages_data}
+        """
+        if end is None:
+            end = len(packages_data)
+        
+        offset_index = {}
+        # Границы станз перебираются одновременно с именами пакетов: и те,
+        # и другие идут в файле по возрастанию смещений
+        boundaries = _BOUNDARY_RE.finditer(packages_data, start, end)
+        boundary = next(boundaries, None)
         
-        return f"{base_url}/dists/jammy/main/binary-amd64/Packages.gz"
+        head = _PACKAGE_HEAD_RE.match(packages_data, start, end)
+        if head:
+            offset_index[head.group(1).decode('ascii')] = (start, end if boundary is None else boundary.start())
+        
+        stanza_start = start
+        for match in _PACKAGE_RE.finditer(packages_data, start, end):
+            # match.start() указывает на перевод строки перед "Package:"
+            while boundary is not None and boundary.end() <= match.start() + 1:
+                stanza_start = boundary.end()
+                boundary = next(boundaries, None)
+            
+            stanza_end = end if boundary is None else boundary.start()
+            offset_index[match.group(1).decode('ascii')] = (stanza_start, stanza_end)
+        
+        return offset_index
     
-    def parse_packages(self, packages_data: str) -> Dict[str, Dict]:
+    def _index_stream(self, blocks: Iterable[bytes]) -> None:
         """
-        Парсинг файла Packages в структуру данных
+        Собрать файл Packages из блоков, индексируя станзы по мере поступления
+        
+        Станзы, завершённые пустой строкой, попадают в индекс сразу после
+        получения блока, так что индексация идёт параллельно с загрузкой.
+        
+        Args:
+            blocks: Блоки файла Packages
+        """
+        data = bytearray()
+        offset_index = {}
+        indexed = 0
+        
+        for block in blocks:
+            data += block
+            cut = indexed
+            for boundary in _BOUNDARY_RE.finditer(data, indexed):
+                cut = boundary.end()
+            if cut > indexed:
+                offset_index.update(self.build_offset_index(data, indexed, cut))
+                indexed = cut
+        
+        if b'\r\n' in data:
+            data = bytearray(data.replace(b'\r\n', b'\n'))
+            offset_index = self.build_offset_index(data)
+        else:
+            offset_index.update(self.build_offset_index(data, indexed))
+        
+        self._data = data
+        self._offset_index = offset_index
+    
+    @staticmethod
+    def parse_stanza(stanza: Union[bytes, memoryview]) -> PackageRecord:
+        """
+        Разобрать поля одной станзы файла Packages
+        
+        Станзу удобно передавать срезом memoryview: тогда копируются
+        только значения полей, а не весь текст станзы.
+        
+        Args:
+            stanza: Текст станзы
+            
+        Returns:
+            PackageRecord: Запись о пакете
+        """
+        fields = dict(match.groups() for match in _FIELD_RE.finditer(stanza))
+        
+        return PackageRecord(
+            name=_decode_value(fields.get(b'Package', b'')),
+            version=_decode_value(fields.get(b'Version', b'')),
+            architecture=_decode_value(fields.get(b'Architecture', b'')),
+            raw_depends=fields.get(b'Depends', b''),
+            raw_pre_depends=fields.get(b'Pre-Depends', b''),
+            raw_provides=fields.get(b'Provides', b''),
+        )
+    
+    def parse_packages(self, packages_data: bytes) -> Dict[str, PackageRecord]:
+        """
+        Полный парсинг файла Packages в структуру данных
+        
+        Большие файлы делятся по границам станз на части, которые
+        разбираются параллельно в отдельных процессах.
         
         Args:
             packages_data: Содержимое файла Packages
@@ -80,48 +352,107 @@ class PackageRepository:
         Returns:
             Dict: Словарь с информацией о пакетах
         """
+        workers = os.cpu_count() or 1
+        
+        if workers == 1 or len(packages_data) < _PARALLEL_MIN_SIZE:
+            return _parse_chunk_bytes(packages_data)
+        
         packages = {}
-        current_package = {}
-        current_field = None
-        
-        for line in packages_data.split('\n'):
-            if line.strip() == '':
-                if current_package and 'Package' in current_package:
-                    pkg_name = current_package['Package']
-                    packages[pkg_name] = current_package
-                current_package = {}
-                current_field = None
-                continue
-            
-            if line.startswith(' '):
-                if current_field:
-                    current_package[current_field] += '\n' + line.strip()
-                continue
-            
-            if ':' in line:
-                field, value = line.split(':', 1)
-                field = field.strip()
-                value = value.strip()
-                current_package[field] = value
-                current_field = field
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk_packages in executor.map(_parse_chunk_bytes,
+                                               _split_stanza_chunks(packages_data, workers)):
+                packages.update(chunk_packages)
         
         return packages
     
-    def get_package_info(self, package_name: str) -> Optional[Dict]:
+    def _load_index(self) -> None:
+        """Загрузить файл Packages и построить индекс, если это ещё не сделано"""
+        if self._data is not None:
+            return
+        
+        cached_validator = self._read_cache_meta() if self.use_cache else None
+        
+        try:
+            self._index_stream(self.fetch_packages_file(cached_validator))
+        except _NotModified:
+            if self._load_disk_cache():
+                return
+            self._index_stream(self.fetch_packages_file())
+        
+        if self.use_cache and self._source_validator:
+            self._save_disk_cache(self._source_validator)
+    
+    def _read_cache_meta(self) -> Optional[Dict[str, str]]:
+        """
+        Прочитать признаки версии закэшированного файла Packages
+        
+        Для URL это заголовки ETag/Last-Modified, для тестового файла -
+        время изменения и размер.
+        
+        Returns:
+            Dict или None: Признаки версии (None, если кэша нет)
+        """
+        if not self.cache_path.exists():
+            return None
+        
+        try:
+            with open(self.cache_meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+    
+    def _load_disk_cache(self) -> bool:
+        """Загрузить файл Packages и его индекс из кэша"""
+        try:
+            with open(self.cache_path, 'rb') as f:
+                self._data, self._offset_index = pickle.load(f)
+        except Exception:
+            return False
+        
+        return True
+    
+    def _save_disk_cache(self, validator: Dict[str, str]) -> None:
+        """Сохранить файл Packages и его индекс в кэш (ошибки записи не критичны)"""
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            
+            tmp_path = self.cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((self._data, self._offset_index), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+            
+            with open(self.cache_meta_path, 'w', encoding='utf-8') as f:
+                json.dump(validator, f)
+        except Exception:
+            pass
+    
+    def get_package_info(self, package_name: str) -> Optional[PackageRecord]:
         """
         Получить информацию о конкретном пакете
         
+        Разбирается только станза запрошенного пакета.
+        
         Args:
             package_name: Имя пакета
             
         Returns:
-            Dict или None: Информация о пакете
+            PackageRecord или None: Информация о пакете
         """
-        if not self.packages_cache:
-            packages_data = self.fetch_packages_file()
-            self.packages_cache = self.parse_packages(packages_data)
+        package_info = self.packages_cache.get(package_name)
+        if package_info is not None:
+            return package_info
+        
+        self._load_index()
         
-        return self.packages_cache.get(package_name)
+        span = self._offset_index.get(package_name)
+        if span is None:
+            return None
+        
+        start, end = span
+        package_info = self.parse_stanza(memoryview(self._data)[start:end])
+        self.packages_cache[package_name] = package_info
+        return package_info
     
     def get_dependencies(self, package_name: str) -> List[str]:
         """
@@ -133,28 +464,15 @@ class PackageRepository:
         Returns:
             List[str]: Список имён зависимых пакетов
         """
-        package_info = self.get_package_info(package_name)
-        
-        if not package_info:
-            return []
+        cached = self._deps_cache.get(package_name)
+        if cached is not None:
+            return cached
         
-        depends_str = package_info.get('Depends', '')
-        
-        if not depends_str:
-            return []
-        
-        dependencies = []
-        
-        for dep in depends_str.split(','):
-            dep = dep.strip()
-            dep = re.sub(r'\s*\([^)]*\)', '', dep)
-            
-            if '|' in dep:
-                dep = dep.split('|')[0].strip()
-            
-            if dep:
-                dependencies.append(dep)
+        package_info = self.get_package_info(package_name)
+        depends = package_info.raw_depends if package_info else b''
         
+        dependencies = [match.group(1).decode('ascii') for match in _DEP_RE.finditer(depends)]
+        self._deps_cache[package_name] = dependencies
         return dependencies
     
     def get_all_packages(self) -> List[str]:
@@ -164,8 +482,31 @@ class PackageRepository:
         Returns:
             List[str]: Список имён пакетов
         """
-        if not self.packages_cache:
-            packages_data = self.fetch_packages_file()
-            self.packages_cache = self.parse_packages(packages_data)
+        self._load_index()
         
-        return list(self.packages_cache.keys())
+        return list(self._offset_index)
+
+
+def _split_stanza_chunks(packages_data: bytes, count: int) -> List[bytes]:
+    """Разрезать файл Packages на count примерно равных частей по границам станз"""
+    chunks = []
+    start = 0
+    
+    for i in range(1, count):
+        boundary = _BOUNDARY_RE.search(packages_data, max(start, len(packages_data) * i // count))
+        if boundary is None:
+            break
+        chunks.append(packages_data[start:boundary.end()])
+        start = boundary.end()
+    
+    chunks.append(packages_data[start:])
+    return chunks
+
+
+def _parse_chunk_bytes(chunk: bytes) -> Dict[str, PackageRecord]:
+    """Разобрать все станзы части файла Packages (выполняется в дочернем процессе)"""
+    view = memoryview(chunk)
+    return {
+        name: PackageRepository.parse_stanza(view[start:end])
+        for name, (start, end) in PackageRepository.build_offset_index(chunk).items()
+    }
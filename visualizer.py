@@ -7,10 +7,15 @@
 """
 
 import argparse
+import contextlib
+import io
 import sys
 from repository import PackageRepository
 from graph_builder import DependencyGraph
 
+# Допустимые расширения выходного файла
+_VALID_EXTS = ('.png', '.svg', '.jpg', '.jpeg')
+
 def create_parser():
     """
     Создаёт и настраивает парсер аргументов командной строки.
@@ -62,6 +67,14 @@ def create_parser():
         help='Имя сгенерированного файла с изображением графа (например: graph.png)'
     )
     
+    # 5. Отключение дискового кэша файла Packages (опциональный флаг)
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        default=False,
+        help='Не использовать и не сохранять кэш файла Packages в ~/.cache/apt-dep-viz/'
+    )
+    
     return parser
 
 
@@ -86,10 +99,12 @@ def validate_arguments(args):
         errors.append("URL или путь к репозиторию не может быть пустым")
     
     # Проверка расширения выходного файла
-    valid_extensions = ['.png', '.svg', '.jpg', '.jpeg']
-    if not any(args.output.lower().endswith(ext) for ext in valid_extensions):
+    # Расширение — всё начиная с последней точки, в том числе для имён
+    # вида ".png", у которых os.path.splitext расширения не находит
+    dot = args.output.rfind('.')
+    if dot < 0 or args.output[dot:].lower() not in _VALID_EXTS:
         errors.append(
-            f"Имя выходного файла должно иметь одно из расширений: {', '.join(valid_extensions)}"
+            f"Имя выходного файла должно иметь одно из расширений: {', '.join(_VALID_EXTS)}"
         )
     
     # Если есть ошибки, выбрасываем исключение
@@ -116,6 +131,139 @@ def print_configuration(args):
     print("=" * 60)
 
 
+class BufferedStdout:
+    """
+    Накапливает вывод print() в памяти и выводит его крупными блоками.
+    """
+    
+    def __init__(self):
+        self.stdout = None
+        self.buffer = io.StringIO()
+        self._redirect = None
+    
+    def __enter__(self):
+        self.stdout = sys.stdout
+        self._redirect = contextlib.redirect_stdout(self.buffer)
+        self._redirect.__enter__()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._redirect.__exit__(*exc_info)
+        self.flush()
+    
+    def flush(self):
+        """Вывести накопленный текст одной операцией записи"""
+        self.stdout.write(self.buffer.getvalue())
+        self.stdout.flush()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+    
+    @contextlib.contextmanager
+    def unbuffered(self):
+        """Временно выводить напрямую, без накопления (для долгих операций)"""
+        self.flush()
+        with contextlib.redirect_stdout(self.stdout):
+            yield
+
+
+def _run(args, output):
+    """
+    Выполняет этапы 2-3: сбор данных и построение графа.
+    
+    Args:
+        args: Объект с разобранными аргументами
+        output: Буфер стандартного вывода (BufferedStdout)
+        
+    Returns:
+        int: Код возврата программы
+    """
+    # Выводим конфигурацию
+    print_configuration(args)
+    
+    # === ЭТАП 2: СБОР ДАННЫХ ===
+    print("\n" + "=" * 60)
+    print("ЭТАП 2: СБОР ДАННЫХ О ЗАВИСИМОСТЯХ")
+    print("=" * 60)
+    
+    # Создаём объект репозитория
+    repo = PackageRepository(args.repository, args.test_mode,
+                             use_cache=False if args.no_cache else None)
+    
+    # Получаем информацию о пакете
+    print(f"\nПоиск пакета '{args.package}'...")
+    # Репозиторий может загружаться долго: его сообщения выводим сразу
+    with output.unbuffered():
+        package_info = repo.get_package_info(args.package)
+    
+    if not package_info:
+        print(f"✗ Пакет '{args.package}' не найден в репозитории")
+        return 1
+    
+    print(f"✓ Пакет найден!")
+    print(f"  Версия: {package_info.version or 'неизвестно'}")
+    print(f"  Архитектура: {package_info.architecture or 'неизвестно'}")
+    
+    # Получаем прямые зависимости
+    dependencies = repo.get_dependencies(args.package)
+    
+    print(f"\n✓ Найдено прямых зависимостей: {len(dependencies)}")
+    
+    if dependencies:
+        print("\nСписок прямых зависимостей:")
+        for i, dep in enumerate(dependencies, 1):
+            print(f"  {i}. {dep}")
+    
+    # === ЭТАП 3: ПОСТРОЕНИЕ ГРАФА ===
+    print("\n" + "=" * 60)
+    print("ЭТАП 3: ПОСТРОЕНИЕ ГРАФА ЗАВИСИМОСТЕЙ (DFS с рекурсией)")
+    print("=" * 60)
+    
+    # Создаём объект для построения графа
+    graph = DependencyGraph(repo)
+    
+    # Строим граф зависимостей с помощью DFS
+    print(f"\nНачинаем построение графа для пакета '{args.package}'...\n")
+    graph.build_graph_dfs(args.package)
+    
+    # Выводим построенный граф
+    graph.print_graph()
+    output.flush()
+    
+    # Получаем статистику
+    stats = graph.get_statistics()
+    
+    print("\n" + "=" * 60)
+    print("СТАТИСТИКА ГРАФА")
+    print("=" * 60)
+    print(f"Всего пакетов в графе: {stats['total_packages']}")
+    print(f"Всего связей (зависимостей): {stats['total_edges']}")
+    print(f"Пакетов без зависимостей (листья): {stats['leaf_packages_count']}")
+    
+    if stats['max_dependencies_package']:
+        print(f"Пакет с максимальным количеством зависимостей:")
+        print(f"  → {stats['max_dependencies_package']} ({stats['max_dependencies_count']} зависимостей)")
+    
+    # Проверяем наличие циклов
+    if graph.has_cycles():
+        print(f"\n⚠ ВНИМАНИЕ: Обнаружены циклические зависимости!")
+        print(f"Количество циклов: {stats['cycles_count']}")
+        print("\nНайденные циклы:")
+        for i, cycle in enumerate(graph.get_cycles(), 1):
+            print(f"  Цикл {i}: {' → '.join(cycle)}")
+    else:
+        print(f"\n✓ Циклических зависимостей не обнаружено")
+    
+    # Получаем все транзитивные зависимости
+    all_deps = graph.get_all_dependencies(args.package)
+    print(f"\nВсего транзитивных зависимостей для '{args.package}': {len(all_deps)}")
+    
+    # Успешное завершение
+    print("\n" + "=" * 60)
+    print("✓ Этап 3: Граф успешно построен!")
+    print("=" * 60)
+    return 0
+
+
 def main():
     """
     Главная функция программы.
@@ -130,87 +278,9 @@ def main():
         # Валидируем аргументы
         validate_arguments(args)
         
-        # Выводим конфигурацию
-        print_configuration(args)
-        
-        # === ЭТАП 2: СБОР ДАННЫХ ===
-        print("\n" + "=" * 60)
-        print("ЭТАП 2: СБОР ДАННЫХ О ЗАВИСИМОСТЯХ")
-        print("=" * 60)
-        
-        # Создаём объект репозитория
-        repo = PackageRepository(args.repository, args.test_mode)
-        
-        # Получаем информацию о пакете
-        print(f"\nПоиск пакета '{args.package}'...")
-        package_info = repo.get_package_info(args.package)
-        
-        if not package_info:
-            print(f"✗ Пакет '{args.package}' не найден в репозитории")
-            return 1
-        
-        print(f"✓ Пакет найден!")
-        print(f"  Версия: {package_info.get('Version', 'неизвестно')}")
-        print(f"  Архитектура: {package_info.get('Architecture', 'неизвестно')}")
-        
-        # Получаем прямые зависимости
-        dependencies = repo.get_dependencies(args.package)
-        
-        print(f"\n✓ Найдено прямых зависимостей: {len(dependencies)}")
-        
-        if dependencies:
-            print("\nСписок прямых зависимостей:")
-            for i, dep in enumerate(dependencies, 1):
-                print(f"  {i}. {dep}")
-        
-        # === ЭТАП 3: ПОСТРОЕНИЕ ГРАФА ===
-        print("\n" + "=" * 60)
-        print("ЭТАП 3: ПОСТРОЕНИЕ ГРАФА ЗАВИСИМОСТЕЙ (DFS с рекурсией)")
-        print("=" * 60)
-        
-        # Создаём объект для построения графа
-        graph = DependencyGraph(repo)
-        
-        # Строим граф зависимостей с помощью DFS
-        print(f"\nНачинаем построение графа для пакета '{args.package}'...\n")
-        graph.build_graph_dfs(args.package)
-        
-        # Выводим построенный граф
-        graph.print_graph()
-        
-        # Получаем статистику
-        stats = graph.get_statistics()
-        
-        print("\n" + "=" * 60)
-        print("СТАТИСТИКА ГРАФА")
-        print("=" * 60)
-        print(f"Всего пакетов в графе: {stats['total_packages']}")
-        print(f"Всего связей (зависимостей): {stats['total_edges']}")
-        print(f"Пакетов без зависимостей (листья): {stats['leaf_packages_count']}")
-        
-        if stats['max_dependencies_package']:
-            print(f"Пакет с максимальным количеством зависимостей:")
-            print(f"  → {stats['max_dependencies_package']} ({stats['max_dependencies_count']} зависимостей)")
-        
-        # Проверяем наличие циклов
-        if graph.has_cycles():
-            print(f"\n⚠ ВНИМАНИЕ: Обнаружены циклические зависимости!")
-            print(f"Количество циклов: {stats['cycles_count']}")
-            print("\nНайденные циклы:")
-            for i, cycle in enumerate(graph.get_cycles(), 1):
-                print(f"  Цикл {i}: {' → '.join(cycle)}")
-        else:
-            print(f"\n✓ Циклических зависимостей не обнаружено")
-        
-        # Получаем все транзитивные зависимости
-        all_deps = graph.get_all_dependencies(args.package)
-        print(f"\nВсего транзитивных зависимостей для '{args.package}': {len(all_deps)}")
-        
-        # Успешное завершение
-        print("\n" + "=" * 60)
-        print("✓ Этап 3: Граф успешно построен!")
-        print("=" * 60)
-        return 0
+        # Весь вывод накапливается и печатается блоками на контрольных точках
+        with BufferedStdout() as output:
+            return _run(args, output)
         
     except ValueError as e:
         print(f"\n✗ ОШИБКА ВАЛИДАЦИИ:", file=sys.stderr)